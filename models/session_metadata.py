@@ -68,10 +68,10 @@ class SessionMetadata:
         return all((isinstance(claim:=session_dict.get(validator_key), validator_type) and timestamp_validator(claim) if validator_key in timestamp_claims else True)
                    for validator_key, validator_type in SessionMetadata.AUTHENTICATION_RESPONSE_TYPES.items())
 
-    def __init__(self, token: bytes, refresh_digest: bytes, lifespan: float):
+    def __init__(self, token: bytes, refresh_digest: bytes, lifespan: float, now: Optional[float] = None):
         self._token = token
         self._refresh_digest = refresh_digest
-        self._last_refresh = time.time()
+        self._last_refresh = time.time() if now is None else now
         self._lifespan = lifespan
         self._valid_until = self._last_refresh + lifespan
         self._iteration = 1
@@ -87,11 +87,12 @@ class SessionMetadata:
     def __repr__(self) -> str:
         return f'<{self.__class__.__name__}({self.token}, {self.refresh_digest}, {self.lifespan}) at location {id(self)}>'
     
-    def update_digest(self, new_digest: bytes) -> None:
+    def update_digest(self, new_digest: bytes, now: Optional[float] = None) -> None:
         self._refresh_digest = new_digest
-        self._last_refresh = time.time()
+        self._last_refresh = time.time() if now is None else now
         self._valid_until = self._last_refresh + self.lifespan
         self._iteration+=1
 
     def get_validity(self) -> float:
-        return self.last_refresh + self.lifespan
+        # Precomputed on creation and refresh
+        return self._valid_until
@@ -9,12 +9,14 @@ class SingletonMetaclass(type):
     _instance_reference: Optional[weakref.ReferenceType[Any]] = None
 
     def __call__(cls, *args, **kwargs):
-        if not cls._instance_reference:
+        # Own namespace only, subclasses get their own instance
+        instance_reference: Optional[weakref.ReferenceType[Any]] = cls.__dict__.get('_instance_reference')
+        if not instance_reference:
             # A temporary strong reference is needed for this method's lifetime, 
             # otherwise the object gets garbage collected before being returned to the constructor's assignee
             instance = super().__call__(*args, **kwargs)
             cls._instance_reference = weakref.ref(instance, lambda _ : setattr(cls, "_instance_reference", None))
-        else:
-            warnings.warn('Attempt to instantiate a singleton class more than once, rejecting...', category=RuntimeWarning)
-        
-        return cls._instance_reference()
+            return instance
+
+        warnings.warn('Attempt to instantiate a singleton class more than once, rejecting...', category=RuntimeWarning)
+        return instance_reference()
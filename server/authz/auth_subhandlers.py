@@ -93,7 +93,6 @@ async def handle_password_change(header_component: BaseHeaderComponent,
 
     # Terminate session and require reauthentication
     user_manager.session.pop(auth_component.identity, None)
-    user_manager.previous_digests_mapping.pop(auth_component.identity, None)
     header: ResponseHeader = ResponseHeader.from_server(config=config, version=header_component.version, code=SuccessFlags.SUCCESSFUL_PASSWORD_CHANGE)
     body = ResponseBody(contents={'message' : f'Reauthentication required'})
 
@@ -102,15 +101,18 @@ async def handle_password_change(header_component: BaseHeaderComponent,
 async def handle_session_refresh(header_component: BaseHeaderComponent,
                                  auth_component: BaseAuthComponent,
                                  config: server_config.ServerConfig,
-                                 user_manager: user_manager.UserManager) -> tuple[ResponseHeader, ResponseBody]:
+                                 user_manager: user_manager.UserManager,
+                                 reader_cache: GlobalReadCacheType,
+                                 amendment_cache: GlobalAmendCacheType) -> tuple[ResponseHeader, ResponseBody]:
     if not auth_component.auth_logical_check('authentication'):
         raise InvalidAuthSemantic('Session refresh requires only the following fields: identity, token, refresh_digest')
     assert auth_component.token and auth_component.refresh_digest
 
     # UserManager.refresh_session() implictly authenticates session
-    new_digest, iteration = await user_manager.refresh_session(username=auth_component.identity,
-                                                               token=auth_component.token,
-                                                               digest=auth_component.refresh_digest)
+    new_digest, iteration = await user_manager.refresh_session(auth_component.identity,
+                                                               auth_component.token,
+                                                               auth_component.refresh_digest,
+                                                               reader_cache, amendment_cache)
     
     header: ResponseHeader = ResponseHeader.from_server(version=header_component.version,
                                                         code=SuccessFlags.SUCCESSFUL_SESSION_REFRESH,
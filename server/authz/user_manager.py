@@ -1,14 +1,17 @@
 import asyncio
-import math
+import heapq
 import os
 import re
 import time
-from datetime import datetime
 from secrets import token_hex
+from binascii import hexlify
 from hmac import compare_digest
 from hashlib import pbkdf2_hmac
-from typing import Optional, Final, TypeAlias, Union, TYPE_CHECKING
+from functools import lru_cache
+from typing import Any, Coroutine, Optional, Final, TypeAlias, Union, TYPE_CHECKING
 import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from aiofiles.threadpool.binary import AsyncBufferedReader, AsyncBufferedIOBase
 
@@ -20,405 +23,462 @@ from models.singletons import SingletonMetaclass
 
 import psycopg.errors as pg_errors
 
-from server.database.connections import ConnectionPriority, ConnectionProxy, ConnectionPoolManager
+from server.database.connections import ConnectionPriority, ConnectionPoolManager
 from server.database.models import ActivityLog, LogAuthor, Severity, LogType
 from server.errors import UserAuthenticationError, DatabaseFailure, Banned, InvalidAuthData, OperationContested
 from server.logging import Logger
 from server.process.events import EventProxy, ExclusiveEventProxy
 
-__all__ = ('UserManager',)
+__all__ = ('UserManager', 'ServerSessionMetadata')
 
 if TYPE_CHECKING: assert REQUEST_CONSTANTS
 
 FileBuffer: TypeAlias = Union[AsyncBufferedReader, AsyncBufferedIOBase]
 
+# Shared statement text, prepared once per connection
+CREDENTIALS_SELECT_SQL: Final[str] = 'SELECT password_hash, password_salt FROM users WHERE username = %s'
+CREDENTIALS_SELECT_LOCKING_SQL: Final[str] = CREDENTIALS_SELECT_SQL + ' FOR UPDATE NOWAIT'
+# Credentials and active ban status in one round trip
+CREDENTIALS_BAN_SELECT_SQL: Final[str] = '''SELECT users.password_hash, users.password_salt,
+                                            EXISTS(SELECT 1 FROM ban_logs
+                                                   WHERE ban_logs.username = users.username AND ban_logs.lifted_at IS NULL)
+                                            FROM users
+                                            WHERE users.username = %s'''
+# Files a user may hold cached buffers for, queried concurrently
+GRANTED_FILES_SELECT_SQL: Final[str] = 'SELECT file_owner, filename FROM file_permissions WHERE grantee = %s'
+PUBLIC_FILES_SELECT_SQL: Final[str] = 'SELECT owner, filename FROM files WHERE public IS true'
+
+class ServerSessionMetadata(SessionMetadata):
+    '''Session metadata as held by the server, additionally remembering replaced refresh digests for replay detection'''
+    __slots__ = '_previous_digests',
+    _previous_digests: deque[bytes]
+
+    PREVIOUS_DIGESTS_LIMIT: Final[int] = 2
+
+    @property
+    def previous_digests(self) -> deque[bytes]:
+        return self._previous_digests
+
+    def __init__(self, token: bytes, refresh_digest: bytes, lifespan: float, now: Optional[float] = None):
+        super().__init__(token, refresh_digest, lifespan, now)
+        # Random padding, never matches a client digest
+        self._previous_digests = deque((os.urandom(len(refresh_digest)) for _ in range(ServerSessionMetadata.PREVIOUS_DIGESTS_LIMIT)),
+                                       maxlen=ServerSessionMetadata.PREVIOUS_DIGESTS_LIMIT)
+
+    def update_digest(self, new_digest: bytes, now: Optional[float] = None) -> None:
+        self._previous_digests.append(self._refresh_digest)    # Bounded deque drops the oldest digest by itself
+        super().update_digest(new_digest, now)
+
 class UserManager(metaclass=SingletonMetaclass):
     '''Class for managing user sessions and user-related operations'''
     HASHING_ALGORITHM: Final[str] = 'sha256'
     PBKDF_ITERATIONS: Final[int] = 100_000
     SALT_LENGTH: Final[int] = 16
+    TOKEN_LENGTH: Final[int] = REQUEST_CONSTANTS.auth.token_length
+    DIGEST_LENGTH: Final[int] = REQUEST_CONSTANTS.auth.digest_length
+    # Compared against when no session exists
+    DUMMY_TOKEN: Final[bytes] = bytes(TOKEN_LENGTH)
+
+    USERNAME_PATTERN: Final[re.Pattern[str]] = re.compile(REQUEST_CONSTANTS.auth.username_regex)
+
+    # Max buffer closes in flight at once
+    CACHE_CLOSE_CONCURRENCY: Final[int] = 32
 
     LOG_ALIAS: Final[LogAuthor] = LogAuthor.USER_MASTER
     LOG_TIMEOUT: Final[float] = 2.0
 
     __slots__ = ('connection_master',
-                 'session', 'session_lifespan', 'session_refresh_nbf', 
-                 '_logger', 'previous_digests_mapping',
-                 '_shutdown_event', '_cleanup_event', '_shutdown_poll_time',
+                 'session', 'session_lifespan', 'session_refresh_nbf', '_expiry_heap',
+                 '_logger', '_ban_cache', '_hashing_pool', '_dummy_credentials',
+                 '_shutdown_event', '_cleanup_event', '_shutdown_poll_time', '_background_tasks',
                  '__weakref__')
 
     def __init__(self,
                  connection_master: ConnectionPoolManager,
                  logger: Logger,
                  session_lifespan: float,
+                 ban_cache_size: int,
+                 ban_cache_ttl: float,
                  shutdown_poll_time: float,
                  shutdown_event: EventProxy,
                  cleanup_event: asyncio.Event):
         self.connection_master: Final[ConnectionPoolManager] = connection_master
-        self.session: Final[dict[str, SessionMetadata]] = {}
+        self.session: Final[dict[str, ServerSessionMetadata]] = {}
+        self._expiry_heap: Final[list[tuple[float, str]]] = []
         self._logger: Final[Logger] = logger
         self.session_lifespan: float = session_lifespan
         self.session_refresh_nbf: float = session_lifespan // 2
-        self.previous_digests_mapping: Final[TTLCache[str, list[bytes]]] = TTLCache(math.inf, self.session_lifespan)
+        self._ban_cache: Final[TTLCache[str, bool]] = TTLCache(ban_cache_size, ban_cache_ttl)
+        # pbkdf2_hmac releases the GIL, keeps hashing off the event loop
+        self._hashing_pool: Final[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix='pbkdf2')
+        # Verified against for unknown usernames
+        self._dummy_credentials: Final[tuple[bytes, bytes]] = UserManager.generate_password_hash(token_hex(UserManager.SALT_LENGTH))
         self._shutdown_event: Final[EventProxy] = shutdown_event
         self._cleanup_event: Final[ExclusiveEventProxy] = ExclusiveEventProxy(cleanup_event, weakref.ref(self))
         self._shutdown_poll_time: float = shutdown_poll_time
+        # Strong references to fire-and-forget tasks
+        self._background_tasks: Final[set[asyncio.Task[None]]] = set()
 
         session_expiry_task: asyncio.Task = asyncio.create_task(self.expire_sessions(), name='Session Trimming Task')
-        asyncio.create_task(self.shutdown_watchdog(session_expiry_task))
+        self._spawn_background_task(self.shutdown_watchdog(session_expiry_task))
+
+    @staticmethod
+    def derive_password_hash(password: str, salt: bytes) -> bytes:
+        # OpenSSL-backed
+        return pbkdf2_hmac(UserManager.HASHING_ALGORITHM, password.strip().encode('utf-8'), salt, iterations=UserManager.PBKDF_ITERATIONS)
 
     @staticmethod
     def generate_password_hash(password: str, salt: Optional[bytes] = None) -> tuple[bytes, bytes]:
-        password = password.strip()
         if not salt:
             salt = os.urandom(UserManager.SALT_LENGTH)
-        return pbkdf2_hmac(UserManager.HASHING_ALGORITHM, password.encode('utf-8'), salt, iterations=UserManager.PBKDF_ITERATIONS), salt
+        return UserManager.derive_password_hash(password, salt), salt
     
     @staticmethod
     def verify_password_hash(password: str, password_hash: bytes, salt: bytes) -> bool:
         try:
-            return compare_digest(
-                pbkdf2_hmac(UserManager.HASHING_ALGORITHM, password.encode('utf-8'), salt, iterations=UserManager.PBKDF_ITERATIONS),
-                password_hash)
+            return compare_digest(UserManager.derive_password_hash(password, salt), password_hash)
         except:
             return False
+
+    async def hash_password(self, password: str) -> tuple[bytes, bytes]:
+        return await asyncio.get_running_loop().run_in_executor(self._hashing_pool, UserManager.generate_password_hash, password)
+
+    async def verify_password(self, password: str, password_hash: bytes, salt: bytes) -> bool:
+        return await asyncio.get_running_loop().run_in_executor(self._hashing_pool, UserManager.verify_password_hash, password, password_hash, salt)
     
     @staticmethod
+    @lru_cache(maxsize=8192)
     def check_username_validity(username: str) -> str:
-        username = username.strip()
-        if not re.match(REQUEST_CONSTANTS.auth.username_regex, username):
+        # fullmatch rejects trailing newlines, only valid names are memoized
+        if not UserManager.USERNAME_PATTERN.fullmatch(username):
             raise UserAuthenticationError(f'Username {username} invalid')
         return username
 
-    # Token and refresh digest generation logic kept as static methods in case we ever need to add any more logic to it
-    @staticmethod
-    def generate_session_token() -> bytes:
-        return token_hex(REQUEST_CONSTANTS.auth.token_length // 2).encode('utf-8')
-    
+    # Token and refresh digest generation logic kept as static methods in case we ever need to add any more logic to it.
+    # Hex-encoded ASCII bytes
     @staticmethod
     def generate_session_refresh_digest() -> bytes:
-        return token_hex(REQUEST_CONSTANTS.auth.digest_length // 2).encode('utf-8')
+        return hexlify(os.urandom(UserManager.DIGEST_LENGTH // 2))
 
-    async def authenticate_session(self, username: str, token: bytes, raise_on_exc: bool = False) -> Optional[SessionMetadata]:
-        auth_data: Optional[SessionMetadata] = self.session.get(username)
+    @staticmethod
+    def generate_session_credentials() -> tuple[bytes, bytes]:
+        # Single entropy read for token and digest
+        credentials: bytes = hexlify(os.urandom((UserManager.TOKEN_LENGTH + UserManager.DIGEST_LENGTH) // 2))
+        return credentials[:UserManager.TOKEN_LENGTH], credentials[UserManager.TOKEN_LENGTH:]
+
+    async def authenticate_session(self, username: str, token: bytes, raise_on_exc: bool = False) -> Optional[ServerSessionMetadata]:
+        auth_data: Optional[ServerSessionMetadata] = self.session.get(username)
         if not auth_data:
+            if isinstance(token, bytes) and len(token) == UserManager.TOKEN_LENGTH:
+                compare_digest(UserManager.DUMMY_TOKEN, token)
             return
-        if (auth_data.get_validity() < time.time()):   # Expired session
+        if (auth_data.valid_until < time.time()):   # Expired session
             self.session.pop(username, None)
             raise UserAuthenticationError('Session expired, please authorize again')
-        try:
-            if compare_digest(auth_data.token, token):
-                return auth_data
-        except Exception as e:
-            self.enqueue_activity(ActivityLog(reported_severity=Severity.ERROR,
-                                              log_details=f'Failed in digest comparison: {e.__class__.__name__}',
-                                              user_concerned=username,
-                                              log_category=LogType.USER))
+        # Length gate leaks nothing compare_digest doesn't
+        if isinstance(token, bytes) and len(token) == UserManager.TOKEN_LENGTH and compare_digest(auth_data.token, token):
+            return auth_data
         if raise_on_exc:
             raise UserAuthenticationError('Invalid authentication token. Please login again')
 
     async def authorize_session(self, username: str, password: str) -> SessionMetadata:
         username = UserManager.check_username_validity(username)
         
+        if self._ban_cache.get(username):
+            raise Banned(username)
+
         async with await self.connection_master.request_connection(level=ConnectionPriority.HIGH) as proxy:
-            if await self.check_banned(username, proxy):
-                raise Banned(username)
-            
             async with proxy.cursor() as cursor:
-                await cursor.execute('''SELECT password_hash, password_salt
-                                     FROM users
-                                     WHERE username = %s;''',
-                                     (username,))
-                pw_data: Optional[tuple[memoryview, memoryview]] = await cursor.fetchone()
+                await cursor.execute(CREDENTIALS_BAN_SELECT_SQL, (username,), prepare=True)
+                user_data: Optional[tuple[memoryview, memoryview, bool]] = await cursor.fetchone()
+
+        if not user_data:
+            await self.verify_password(password, *self._dummy_credentials)
+            raise UserAuthenticationError('Invalid username or password')
 
-        if not pw_data:
-            raise UserAuthenticationError(f'No username with {username} exists')
+        password_hash, password_salt, banned = user_data
+        self._ban_cache[username] = banned
+        if banned:
+            raise Banned(username)
  
-        if not UserManager.verify_password_hash(password, *pw_data):
-            self.enqueue_activity(ActivityLog(reported_severity=Severity.ERROR,
-                                              log_details=f'Incorrect password: {UserAuthenticationError.__name__}',
-                                              user_concerned=username,
-                                              log_category=LogType.USER))
+        if not await self.verify_password(password, password_hash, password_salt):
+            self.enqueue_activity(reported_severity=Severity.ERROR,
+                                  log_details=f'Incorrect password: {UserAuthenticationError.__name__}',
+                                  user_concerned=username,
+                                  log_category=LogType.USER)
             
-            raise UserAuthenticationError(f'Invalid password for user {username}')
+            raise UserAuthenticationError('Invalid username or password')
                 
         # Set new session
-        auth_data: SessionMetadata = SessionMetadata(UserManager.generate_session_token(), UserManager.generate_session_refresh_digest(), lifespan=self.session_lifespan)
+        auth_data: ServerSessionMetadata = ServerSessionMetadata(*UserManager.generate_session_credentials(), lifespan=self.session_lifespan, now=time.time())
         self.session[username] = auth_data
+        heapq.heappush(self._expiry_heap, (auth_data.valid_until, username))
 
         return auth_data
         
     async def create_user(self, username: str, password: str, root: str, make_dir: bool = False) -> None:
         username = UserManager.check_username_validity(username)
         
+        pw_hash, pw_salt = await self.hash_password(password)
         async with await self.connection_master.request_connection(level=ConnectionPriority.HIGH) as proxy:   # Account creation is high-priority
             async with proxy.cursor() as cursor:
-                await cursor.execute('''SELECT username FROM users WHERE username = %s''', (username,))
-                res: Optional[tuple[str]] = await cursor.fetchone()
-                if res:
-                    raise UserAuthenticationError(f'Local user {res[0]} already exists')
-                
-                pw_hash, pw_salt = UserManager.generate_password_hash(password)
-                try:
-                    await cursor.execute('''INSERT INTO users (username, password_hash, password_salt) VALUES (%s, %s, %s)''',
-                                        (username, pw_hash, pw_salt,))
-                    await proxy.commit()
-                except pg_errors.UniqueViolation:
+                # No returned row means the username is taken
+                await cursor.execute('''INSERT INTO users (username, password_hash, password_salt)
+                                     VALUES (%s, %s, %s)
+                                     ON CONFLICT (username) DO NOTHING
+                                     RETURNING username;''',
+                                     (username, pw_hash, pw_salt,), prepare=True)
+                if not await cursor.fetchone():
                     raise UserAuthenticationError(f'Local user {username} already exists')
+                await proxy.commit()
 
         if make_dir:
-            os.makedirs(os.path.join(root, username))
+            user_directory: str = f'{root}{os.sep}{username}'
+            try:
+                os.mkdir(user_directory)
+            except FileExistsError:
+                pass
+            except FileNotFoundError:   # First registration, files root not created yet
+                os.makedirs(user_directory, exist_ok=True)
 
     async def delete_user(self, username: str, password: str, *caches) -> None:
         username = UserManager.check_username_validity(username)
 
         async with await self.connection_master.request_connection(level=ConnectionPriority.MODERATE) as proxy:
             async with proxy.cursor() as cursor:
-                await cursor.execute('''SELECT password_hash, password_salt
-                                     FROM users
-                                     WHERE users.username = %s
-                                     FOR UPDATE NOWAIT;''',
-                                     (username,))
+                await cursor.execute(CREDENTIALS_SELECT_LOCKING_SQL, (username,), prepare=True)
                 pw_data: Optional[tuple[memoryview, memoryview]] = await cursor.fetchone()
                 if not pw_data:
-                    raise UserAuthenticationError(f'No username with {username} exists')
+                    await self.verify_password(password, *self._dummy_credentials)
+                    raise UserAuthenticationError('Invalid username or password')
                 
-                if not UserManager.verify_password_hash(password, *pw_data):
-                    raise UserAuthenticationError(f'Invalid password for user {username}')
+                if not await self.verify_password(password, *pw_data):
+                    raise UserAuthenticationError('Invalid username or password')
                 
                 # All checks passed
                 await cursor.execute('''DELETE FROM users
                                      WHERE username = %s;''',
-                                     (username,))
+                                     (username,), prepare=True)
 
         # User deleted, delete session
         self.session.pop(username, None)
-        self.previous_digests_mapping.pop(username, None)
         # Perform relatively less important task of trimming the cache preemptive to usual expiry of this user's buffered readers/writers
         if caches:
-            asyncio.create_task(self.terminate_user_cache(username, *caches))
+            self._spawn_background_task(self.terminate_user_cache(username, *caches))
 
     async def change_password(self, username: str, new_password: str) -> None:
         async with await self.connection_master.request_connection(level=ConnectionPriority.MODERATE) as proxy:
             try:
                 async with proxy.cursor() as cursor:
-                    await cursor.execute('''SELECT password_hash, password_salt
-                                            FROM users
-                                            WHERE username = %s
-                                            FOR UPDATE NOWAIT;''',
-                                            (username,))
+                    await cursor.execute(CREDENTIALS_SELECT_LOCKING_SQL, (username,), prepare=True)
                     pw_data: Optional[tuple[bytes, bytes]] = await cursor.fetchone()    # record will always exist if authentication was passed
                     assert pw_data
 
-                    if UserManager.verify_password_hash(new_password, *pw_data):  # Same password as before
+                    if await self.verify_password(new_password, *pw_data):  # Same password as before
                         raise InvalidAuthData('Password cannot be same as previous password')
-                    pw_hash, pw_salt = UserManager.generate_password_hash(new_password)
+                    pw_hash, pw_salt = await self.hash_password(new_password)
                     await cursor.execute('''UPDATE users
-                                            SET pw_hash = %s, pw_salt = %s
+                                            SET password_hash = %s, password_salt = %s
                                             WHERE username = %s''',
-                                            (pw_hash, pw_salt, username,))
+                                            (pw_hash, pw_salt, username,), prepare=True)
                     await proxy.commit()
             except pg_errors.Error as e:    # Explicit handling here to raise protocol-specific exceptions instead of propogating psycopg's exceptions
                 if isinstance(e, pg_errors.LockNotAvailable):
                     raise OperationContested
                 raise DatabaseFailure('Failed to perform password updation. Please try again')
 
-    async def terminate_user_cache(self, identifier: str, *caches: TTLCache[str, dict[str, FileBuffer]]) -> None:
+    async def _fetch_file_rows(self, query: str, params: Optional[tuple[str, ...]] = None) -> list[tuple[str, str]]:
         async with await self.connection_master.request_connection(level=ConnectionPriority.LOW) as proxy:
             async with proxy.cursor() as cursor:
-                # Fetch all possible files where the user may have cached a file buffer.
-                await cursor.execute('''SELECT file_owner, filename
-                                     FROM file_permissions
-                                     WHERE grantee = %s
-                                     UNION
-                                     SELECT owner, filename
-                                     FROM files
-                                     WHERE public IS true;''',
-                                     (identifier,))
-                
-                res: list[tuple[str, str]] = await cursor.fetchall()
-                cache_identifers: list[str] = [os.path.join(*file_data) for file_data in res]   # Generate actual cache keys as string 'file_owner/filename'
+                await cursor.execute(query, params, prepare=True)
+                return await cursor.fetchall()
+
+    async def terminate_user_cache(self, identifier: str, *caches: TTLCache[str, dict[str, FileBuffer]]) -> None:
+        if not caches:  # Nothing to evict from, skip leasing connections entirely
+            return
+
+        # Fetch all possible files where the user may have cached a file buffer
+        granted_files, public_files = await asyncio.gather(self._fetch_file_rows(GRANTED_FILES_SELECT_SQL, (identifier,)),
+                                                           self._fetch_file_rows(PUBLIC_FILES_SELECT_SQL))
+        res: set[tuple[str, str]] = set(granted_files)
+        res.update(public_files)
         
-        for cache in caches:
-            # Fetch all mappings for possible files
-            buffered_obj_mappings: list[dict[str, FileBuffer]] = [cache[cache_identifier] for cache_identifier in cache_identifers if cache_identifier in cache]
-            for buffered_obj_mapping in buffered_obj_mappings:
-                # Close cached buffer if found
+        # Cache keys are 'file_owner/filename'
+        closed_buffers: list[tuple[str, FileBuffer]] = []
+        for file_owner, filename in res:
+            cache_identifier: str = f'{file_owner}{os.sep}{filename}'
+            for cache in caches:
+                buffered_obj_mapping: Optional[dict[str, FileBuffer]] = cache.get(cache_identifier)
+                if buffered_obj_mapping is None:
+                    continue
                 if buffered_obj := buffered_obj_mapping.pop(identifier, None):
+                    closed_buffers.append((cache_identifier, buffered_obj))
+
+        # Close concurrently, one failure doesn't abort the rest
+        if closed_buffers:
+            close_limiter: asyncio.Semaphore = asyncio.Semaphore(UserManager.CACHE_CLOSE_CONCURRENCY)
+            async def limited_close(buffered_obj: FileBuffer) -> None:
+                async with close_limiter:
                     await buffered_obj.close()
+            results: list[Optional[BaseException]] = await asyncio.gather(*(limited_close(buffered_obj) for _, buffered_obj in closed_buffers),
+                                                                          return_exceptions=True)
+            for (cache_identifier, buffered_obj), result in zip(closed_buffers, results):
+                if result is None:
+                    continue
+                # A failed writer close may have lost unflushed data
+                self.enqueue_activity(user_concerned=identifier,
+                                      reported_severity=Severity.ERROR if isinstance(buffered_obj, AsyncBufferedReader) else Severity.CRITICAL_FAILURE,
+                                      log_details=f'Failed to close cached buffer for {cache_identifier}: {result.__class__.__name__} ({result})'[:512],
+                                      log_category=LogType.INTERNAL)
 
     async def terminate_session(self, username: str, token: bytes) -> SessionMetadata:
         auth_data: Optional[SessionMetadata] = self.session.get(username)
         if not auth_data:
             raise UserAuthenticationError(f'No session for user {username} found')
         try:
-            if compare_digest(auth_data.token, token):
+            if isinstance(token, bytes) and len(token) == UserManager.TOKEN_LENGTH and compare_digest(auth_data.token, token):
                 self.session.pop(username, None)
-                self.previous_digests_mapping.pop(username, None)
                 return auth_data
             
             raise UserAuthenticationError('Invalid token')
         except Exception as e:
-            self.enqueue_activity(ActivityLog(user_concerned=username,
-                                              reported_severity=Severity.ERROR,
-                                              log_details=f'Failed in digest comparison: {e.__class__.__name__}',
-                                              log_category=LogType.USER))
+            self.enqueue_activity(user_concerned=username,
+                                  reported_severity=Severity.ERROR,
+                                  log_details=f'Failed in digest comparison: {e.__class__.__name__}',
+                                  log_category=LogType.USER)
             raise UserAuthenticationError('Failed to log out (Possibly corrupted token)')
 
-    async def refresh_session(self, username: str, token: bytes, digest: bytes) -> tuple[bytes, int]:
-        auth_data: Optional[SessionMetadata] = await self.authenticate_session(username, token)
+    async def refresh_session(self, username: str, token: bytes, digest: bytes, *caches: TTLCache[str, dict[str, FileBuffer]]) -> tuple[bytes, int]:
+        auth_data: Optional[ServerSessionMetadata] = await self.authenticate_session(username, token)
         if not auth_data:
             raise UserAuthenticationError('No such session exists')
         
-        if time.time() < auth_data.last_refresh + self.session_refresh_nbf:    # Premature refresh attempt
+        now: float = time.time()
+        if now < auth_data.last_refresh + self.session_refresh_nbf:    # Premature refresh attempt
             raise UserAuthenticationError('Session not old enough to refresh yet')
         
         # session exists, token matches, and refresh attempt is mature. Proceed to check refresh digest
         try:
-            # Check expired digests (if any), if match then treat as replay attack
-            previous_digests: list[bytes] = self.previous_digests_mapping.get(username, [])
-            if previous_digests and any(compare_digest(previous_digest, digest) for previous_digest in previous_digests):
+            if not isinstance(digest, bytes) or len(digest) != UserManager.DIGEST_LENGTH:
+                raise UserAuthenticationError('Invalid refresh digest')
+
+            # Check expired digests, if match then treat as replay attack. No short-circuiting
+            replayed: bool = False
+            for previous_digest in auth_data.previous_digests:
+                replayed |= compare_digest(previous_digest, digest)
+            if replayed:
                 self.session.pop(username, None)
-                self.previous_digests_mapping.pop(username, None)
-                asyncio.create_task(self.terminate_user_cache(username))
+                # Compromised session, close its buffers too
+                if caches:
+                    self._spawn_background_task(self.terminate_user_cache(username, *caches))
                 raise UserAuthenticationError('Expired digest provided. Please authenticate again')
             
             if not compare_digest(auth_data.refresh_digest, digest):
                 raise UserAuthenticationError('Invalid refresh digest')
             
+            # No awaits until the update below, so refreshes cannot interleave
             new_digest: bytes = UserManager.generate_session_refresh_digest()
-            # Optimistic check
-            self.session.pop(username, None)
-            set_pair: SessionMetadata = self.session.setdefault(username, SessionMetadata(token, new_digest, lifespan=self.session_lifespan))
-            if not compare_digest(set_pair.refresh_digest, new_digest):
-                raise UserAuthenticationError('Failed to reauthenticate session due to repeated request')
-            
-            # New token set, update previous digests for this user
-            previous_digests.append(auth_data.refresh_digest)
-            # Remove oldest digest if list size over 2
-            if len(previous_digests) > 2:
-                previous_digests.pop(0)
-            
-            self.previous_digests_mapping[username] = previous_digests
 
         except Exception as e:
             self.session.pop(username, None)
-            self.previous_digests_mapping.pop(username, None)
-            self.enqueue_activity(ActivityLog(user_concerned=username,
-                                              reported_severity=Severity.ERROR,
-                                              log_details=f'Failed to refresh session: {e.__class__.__name__}',
-                                              log_category=LogType.USER if isinstance(e, UserAuthenticationError) else LogType.SESSION))
+            self.enqueue_activity(user_concerned=username,
+                                  reported_severity=Severity.ERROR,
+                                  log_details=f'Failed to refresh session: {e.__class__.__name__}',
+                                  log_category=LogType.USER if isinstance(e, UserAuthenticationError) else LogType.SESSION)
             if isinstance(e, UserAuthenticationError):
                 raise e
             # Generic handler for exceptions rising from hmac.compare_digest()
             raise UserAuthenticationError('Invalid session refresh digest. Please login again')
-        auth_data.update_digest(new_digest)
-        self.session[username] = auth_data
+        auth_data.update_digest(new_digest, now)
+        heapq.heappush(self._expiry_heap, (auth_data.valid_until, username))
 
         return new_digest, auth_data.iteration
 
-    async def check_banned(self, username: str, proxy: Optional[ConnectionProxy] = None, reclaim_on_exc: bool = True, lock_row: bool = False) -> bool:
-        new_proxy: bool = proxy is None
-        if not proxy:
-            proxy = await self.connection_master.request_connection(level=ConnectionPriority.LOW)
-        query: str = '''SELECT username
-                        FROM ban_logs
-                        WHERE username = %s AND lifted_at IS NOT NULL and lifted_at < %s
-                        ORDER BY lifted_at DESC
-                        LIMIT 1'''
-        if lock_row:
-            query += '\nFOR UPDATE NOWAIT'
-        query += ';'
-        
-        try:
-            async with proxy.cursor() as cursor:
-                await cursor.execute(query, (username, datetime.now()))
-                return bool(await cursor.fetchone())
-        except pg_errors.LockNotAvailable:
-            return True
-        except Exception as e:
-            self.enqueue_activity(ActivityLog(user_concerned=username,
-                                              reported_severity=Severity.NON_CRITICAL_FAILURE,
-                                              log_details=f'Failed in check ban status: {e.__class__.__name__}',
-                                              log_category=LogType.DATABASE))
-            if reclaim_on_exc:
-                await self.connection_master.reclaim_connection(proxy)
-            return True
-        finally:
-            if new_proxy:
-                await self.connection_master.reclaim_connection(proxy)
-
     async def ban(self, username: str, ban_reason: str, ban_description: Optional[str] = None, *caches: TTLCache[str, dict[str, FileBuffer]]) -> None:
         username = UserManager.check_username_validity(username)
         
         async with await self.connection_master.request_connection(level=ConnectionPriority.HIGH) as proxy:
             # NOTE: Explicit error-handling here to allow for protocol-specific exceptions to be raised in place of psycopg3's exceptions
             try:
-                if await self.check_banned(username, proxy):
-                    self.enqueue_activity(ActivityLog(user_concerned=username,
-                                                      reported_severity=Severity.NON_CRITICAL_FAILURE,
-                                                      log_details=f'Duplicate ban attempt: {DatabaseFailure.__name__}',
-                                                      log_category=LogType.USER))
-                    return
-                
+                # No returned row means an active ban already exists
                 async with proxy.cursor() as cursor:
-                    await cursor.execute('''INSERT INTO ban_logs
-                                VALUES (%s, %s, %s);''',
-                                (username, ban_reason.strip(), ban_description.strip() if ban_description else None))
-                    await proxy.commit()
+                    await cursor.execute('''INSERT INTO ban_logs (username, ban_reason, ban_description)
+                                         VALUES (%s, %s, %s)
+                                         ON CONFLICT (username) WHERE lifted_at IS NULL DO NOTHING
+                                         RETURNING username;''',
+                                         (username, ban_reason.strip(), ban_description.strip() if ban_description else None), prepare=True)
+                    banned: bool = bool(await cursor.fetchone())
+                await proxy.commit()
             except pg_errors.Error as e:
-                self.enqueue_activity(ActivityLog(user_concerned=username,
-                                                  reported_severity=Severity.CRITICAL_FAILURE,
-                                                  log_details=f'Failed to ban user: {e.__class__.__name__}',
-                                                  log_category=LogType.DATABASE))
-            
-            raise DatabaseFailure(f'Failed to ban user {username}')
+                self.enqueue_activity(user_concerned=username,
+                                      reported_severity=Severity.CRITICAL_FAILURE,
+                                      log_details=f'Failed to ban user: {e.__class__.__name__}',
+                                      log_category=LogType.DATABASE)
+                raise DatabaseFailure(f'Failed to ban user {username}')
+
+        self._ban_cache[username] = True
+        if not banned:
+            self.enqueue_activity(user_concerned=username,
+                                  reported_severity=Severity.NON_CRITICAL_FAILURE,
+                                  log_details=f'Duplicate ban attempt: {DatabaseFailure.__name__}',
+                                  log_category=LogType.USER)
+            return
 
         # Once user is banned, terminate their session and any possible cache entries too
         self.session.pop(username, None)
-        self.previous_digests.pop(username, None)
         if caches:
-            asyncio.create_task(self.terminate_user_cache(identifier=str, *caches))
+            self._spawn_background_task(self.terminate_user_cache(username, *caches))
 
     async def unban(self, username: str) -> None:
         username = UserManager.check_username_validity(username)
         
         async with await self.connection_master.request_connection(level=ConnectionPriority.MODERATE) as proxy:
-            if not await self.check_banned(username, proxy, lock_row=True):
-                self.enqueue_activity(ActivityLog(user_concerned=username,
-                                                  reported_severity=Severity.NON_CRITICAL_FAILURE,
-                                                  log_details=f'Duplicate unban attempt: {DatabaseFailure.__name__}',
-                                                  log_category=LogType.USER))
-                return
             async with proxy.cursor() as cursor:
+                # No returned row means no active ban
                 await cursor.execute('''UPDATE ban_logs
-                                     SET lifted_at = %s
-                                     WHERE username = %s AND lifted_at is null;''',
-                                     (datetime.now(), username,))
+                                     SET lifted_at = CURRENT_TIMESTAMP
+                                     WHERE username = %s AND lifted_at is null
+                                     RETURNING username;''',
+                                     (username,), prepare=True)
+                lifted: bool = bool(await cursor.fetchone())
             await proxy.commit()
 
+        self._ban_cache[username] = False
+        if not lifted:
+            self.enqueue_activity(user_concerned=username,
+                                  reported_severity=Severity.NON_CRITICAL_FAILURE,
+                                  log_details=f'Duplicate unban attempt: {DatabaseFailure.__name__}',
+                                  log_category=LogType.USER)
+
     async def shutdown_watchdog(self, session_trim_task: asyncio.Task[None]) -> None:
         while not self._shutdown_event.is_set():
             await asyncio.sleep(self._shutdown_poll_time)
 
         # Shutdown event triggered
         session_trim_task.cancel()
+        self._hashing_pool.shutdown(wait=False, cancel_futures=True)
         self.session.clear()
-        self.previous_digests_mapping.clear()
+        self._expiry_heap.clear()
         self._cleanup_event.set(self)
 
     async def expire_sessions(self) -> None:
         while True:
             reference_threshold: float = time.time()
-            hitlist: list[str] = []
-            for username, auth_data in self.session.items():
-                if auth_data.get_validity() < reference_threshold:
-                    hitlist.append(username)  
-            for user in hitlist:
-                self.session.pop(user, None)
-                self.previous_digests_mapping.pop(user, None)
-            await asyncio.sleep(self.session_lifespan // 3)
-
-    def enqueue_activity(self, log: ActivityLog) -> None:
-        log.logged_by = UserManager.LOG_ALIAS
-        asyncio.create_task(self._logger.enqueue_log(log))
+            # Heap entries may be stale, the live session decides
+            while self._expiry_heap and self._expiry_heap[0][0] < reference_threshold:
+                _, username = heapq.heappop(self._expiry_heap)
+                auth_data: Optional[SessionMetadata] = self.session.get(username)
+                if auth_data and auth_data.valid_until < reference_threshold:
+                    self.session.pop(username, None)
+            # Sleep until the earliest expiry
+            await asyncio.sleep(min(self._expiry_heap[0][0] - reference_threshold, self.session_lifespan // 3)
+                                if self._expiry_heap else self.session_lifespan // 3)
+
+    def _spawn_background_task(self, coro: Coroutine[Any, Any, None]) -> asyncio.Task[None]:
+        task: asyncio.Task[None] = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    def enqueue_activity(self, **log_fields) -> None:
+        self._logger.enqueue_log_nowait(ActivityLog(logged_by=UserManager.LOG_ALIAS, **log_fields))
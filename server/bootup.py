@@ -78,6 +78,8 @@ def create_user_master(connection_master: ConnectionPoolManager,
     return UserManager(connection_master=connection_master,
                        logger=logger,
                        session_lifespan=config.session_lifespan,
+                       ban_cache_size=config.ban_cache_size,
+                       ban_cache_ttl=config.ban_cache_ttl,
                        shutdown_poll_time=shutdown_poll_interval,
                        shutdown_event=shutdown_event,
                        cleanup_event=cleanup_event)
@@ -116,6 +118,7 @@ def create_logger(config: ServerConfig,
                    connection_master=connection_master,
                    batch_size=config.log_batch_size,
                    flush_interval=config.log_interval,
+                   queue_size=config.log_queue_size,
                    shutdown_polling_interval=shutdown_polling_interval,
                    shutdown_event=shutdown_event,
                    cleanup_event=cleanup_event)
@@ -65,6 +65,8 @@ class ServerConfig(BaseModel):
                          Annotated[float, Field(ge=0)],
                          Annotated[float, Field(ge=0)]]
     session_lifespan: Annotated[float, Field(ge=0, le=86400)]   # 86400 seconds = 1 day
+    ban_cache_size: Annotated[int, Field(ge=1)]
+    ban_cache_ttl: Annotated[float, Field(ge=0)]
 
     # Logging
     log_batch_size: Annotated[int, Field(ge=1)]
@@ -97,7 +97,7 @@ class ConnectionProxy(SupportsConnection if TYPE_CHECKING else object):
                          exc_type: type[BaseException] | None,
                          exc_val: BaseException | None,
                          exc_tb: TracebackType | None) -> None:
-        await self._conn._manager.reclaim_connection(proxy=self)
+        self._conn._manager.reclaim_connection(proxy=self)
 
 class LeasedConnection:
     '''Abstraction over `pg.AsyncConnection` to allow for enforcing a timed leased on the underlying connection to the database server.
@@ -156,14 +156,15 @@ class LeasedConnection:
         self._in_use = False
         self._lease_expired = False
 
-    async def begin_lease_timer(self):
+    async def begin_lease_timer(self, token: str):
         await asyncio.sleep(self.lease_duration)
+        if self._usage_token != token:  # Lease already reclaimed
+            return
         self._lease_expired = True
-        if self._usage_token:
-            await self.return_to_pool()
+        await self.return_to_pool()
 
     async def return_to_pool(self):
-        self._reset_usage()
+        self._manager._return_connection(self)
     
     def __getattr__(self, name):
         attr = getattr(self._pgconn, name)
@@ -218,12 +219,13 @@ class ConnectionPoolManager:
         self._lp_connection_pool: Final[asyncio.Queue[LeasedConnection]] = asyncio.Queue(maxsize=low_priority_conns)
 
     async def populate_pools(self, conninfo: str) -> None:
+        # Prepare statements from their second execution
         for _ in range(self._hp_connection_pool.maxsize):
-            await self._hp_connection_pool.put(await LeasedConnection.connect(conninfo, self, self.lease_duration, ConnectionPriority.HIGH, autocommit=True))
+            await self._hp_connection_pool.put(await LeasedConnection.connect(conninfo, self, self.lease_duration, ConnectionPriority.HIGH, autocommit=True, prepare_threshold=1))
         for _ in range(self._mp_connection_pool.maxsize):
-            await self._mp_connection_pool.put(await LeasedConnection.connect(conninfo, self, self.lease_duration, ConnectionPriority.MODERATE, autocommit=True))
+            await self._mp_connection_pool.put(await LeasedConnection.connect(conninfo, self, self.lease_duration, ConnectionPriority.MODERATE, autocommit=True, prepare_threshold=1))
         for _ in range(self._lp_connection_pool.maxsize):
-            await self._lp_connection_pool.put(await LeasedConnection.connect(conninfo, self, self.lease_duration, ConnectionPriority.LOW, autocommit=True))
+            await self._lp_connection_pool.put(await LeasedConnection.connect(conninfo, self, self.lease_duration, ConnectionPriority.LOW, autocommit=True, prepare_threshold=1))
 
         asyncio.create_task(self.connection_cleaner())
 
@@ -247,21 +249,27 @@ class ConnectionPoolManager:
 
         requested_connection._lease_duration = max_lease_duration
         proxy: ConnectionProxy = ConnectionProxy(leased_conn=requested_connection, token=token) # type: ignore
-        asyncio.create_task(requested_connection.begin_lease_timer())
+        asyncio.create_task(requested_connection.begin_lease_timer(token))
 
         return proxy
     
-    async def reclaim_connection(self, proxy: ConnectionProxy) -> None:
+    def reclaim_connection(self, proxy: ConnectionProxy) -> None:
         if proxy._conn.manager != self:
             raise ValueError(f'Connection not reclaimable as it does not belong to this instance of {self.__class__.__name__}')
         
-        proxy._conn._reset_usage()
-        if proxy._conn.priority == ConnectionPriority.HIGH:
-            await self._hp_connection_pool.put(proxy._conn)
-        elif proxy._conn.priority == ConnectionPriority.MODERATE:
-            await self._mp_connection_pool.put(proxy._conn)
+        if proxy.token != proxy._conn._usage_token:    # Lease already reclaimed or expired
+            return
+        self._return_connection(proxy._conn)
+
+    def _return_connection(self, connection: LeasedConnection) -> None:
+        connection._reset_usage()
+        # Pool always has a free slot for its own connection
+        if connection.priority == ConnectionPriority.HIGH:
+            self._hp_connection_pool.put_nowait(connection)
+        elif connection.priority == ConnectionPriority.MODERATE:
+            self._mp_connection_pool.put_nowait(connection)
         else:
-            await self._lp_connection_pool.put(proxy._conn)
+            self._lp_connection_pool.put_nowait(connection)
 
     async def connection_cleaner(self) -> None:
         while not self._shutdown_event.is_set():
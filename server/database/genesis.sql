@@ -61,6 +61,7 @@ CREATE TABLE IF NOT EXISTS ban_logs(
 
 CREATE INDEX ix_ban_logs_lifted_at ON ban_logs(lifted_at);
 CREATE INDEX ix_ban_logs_ban_time ON ban_logs(ban_time);
+CREATE UNIQUE INDEX ix_ban_logs_active_username ON ban_logs(username) WHERE lifted_at IS NULL;
 
 CREATE TABLE IF NOT EXISTS activity_logs(
     id                  BIGSERIAL PRIMARY KEY,
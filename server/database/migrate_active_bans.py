@@ -0,0 +1,51 @@
+'''Standalone script for bringing databases created before the unique partial index on active bans up to date.
+Safe to rerun, and a no-op on databases created through `genesis.py` since those already carry the index'''
+
+import os
+from typing import Final
+from dotenv import load_dotenv
+
+import psycopg as pg
+import psycopg.conninfo
+
+__all__ = ('migrate_active_bans_main',)
+
+# Lift all but the newest unlifted ban per user
+DUPLICATE_BANS_LIFT_SQL: Final[str] = '''UPDATE ban_logs
+                                SET lifted_at = CURRENT_TIMESTAMP
+                                WHERE lifted_at IS NULL
+                                AND (username, ban_time) NOT IN (SELECT DISTINCT ON (username) username, ban_time
+                                                                 FROM ban_logs
+                                                                 WHERE lifted_at IS NULL
+                                                                 ORDER BY username, ban_time DESC);'''
+
+# Leftover of an interrupted concurrent build
+INVALID_INDEX_SELECT_SQL: Final[str] = '''SELECT 1 FROM pg_index
+                                 JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+                                 WHERE pg_class.relname = 'ix_ban_logs_active_username' AND NOT pg_index.indisvalid;'''
+
+ACTIVE_BAN_INDEX_CREATION_SQL: Final[str] = '''CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_ban_logs_active_username
+                                      ON ban_logs(username) WHERE lifted_at IS NULL;'''
+
+def migrate_active_bans_main() -> None:
+    loaded: bool = load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'),
+                            override=True, verbose=True)
+    if not loaded:
+        raise FileNotFoundError
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    connection = pg.connect(conninfo=psycopg.conninfo.make_conninfo(
+        user=os.environ['PG_USERNAME'], password=os.environ['PG_PASSWORD'],
+        host=os.environ['PG_HOST'], port=os.environ['PG_PORT'], dbname=os.environ['PG_DBNAME']),
+        autocommit=True
+        )
+
+    with connection:
+        connection.execute(DUPLICATE_BANS_LIFT_SQL)
+
+        if connection.execute(INVALID_INDEX_SELECT_SQL).fetchone():
+            connection.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_ban_logs_active_username;')
+        connection.execute(ACTIVE_BAN_INDEX_CREATION_SQL)
+
+if __name__ == '__main__':
+    migrate_active_bans_main()
@@ -52,7 +52,7 @@ async def check_file_permission(filename: str, owner: str, grantee: str,
             role_mapping: Optional[dict[str, str]] = await cursor.fetchone()
     finally:
         if reclaim_after:
-            await connection_master.reclaim_connection(proxy)
+            connection_master.reclaim_connection(proxy)
     
     return bool(role_mapping)
 
@@ -93,7 +93,7 @@ async def get_user(username: str,
             return await cursor.fetchone()
     finally:
         if reclaim_after:
-            await connection_master.reclaim_connection(proxy)
+            connection_master.reclaim_connection(proxy)
 
 async def get_file_data(filename: str,
                         owner: str,
@@ -126,7 +126,7 @@ async def get_file_data(filename: str,
             return await cursor.fetchone()
     finally:
         if reclaim_after:
-            await connection_master.reclaim_connection(proxy)
+            connection_master.reclaim_connection(proxy)
 
 async def check_file_existence(filename: str,
                                owner: str,
@@ -162,4 +162,4 @@ async def check_file_existence(filename: str,
             return bool(await cursor.fetchone())
     finally:
         if reclaim_after:
-            await connection_master.reclaim_connection(proxy)
\ No newline at end of file
+            connection_master.reclaim_connection(proxy)
\ No newline at end of file
@@ -121,7 +121,7 @@ class StorageCache(OrderedDict, metaclass=SingletonMetaclass):
             await cursor.execute(StorageCache.storage_fetch_query, (username,))
             result: Optional[DictRow] = await cursor.fetchone()
         if release_after:
-            await self.connection_master.reclaim_connection(proxy)
+            self.connection_master.reclaim_connection(proxy)
         
         if not result:
             raise UserNotFound(f'User {username} not found')
@@ -173,7 +173,7 @@ class StorageCache(OrderedDict, metaclass=SingletonMetaclass):
                 raise FileNotFound(file, username)
         
         if release_after:
-            await self.connection_master.reclaim_connection(proxy)
+            self.connection_master.reclaim_connection(proxy)
 
         self.setdefault(username, storage_data)
         return self[username].file_data.setdefault(file, result[0])
@@ -1,16 +1,17 @@
 import asyncio
 import weakref
+from collections import deque
 from typing import Final, Sequence
 from traceback import format_exception_only
 
-from server.database.connections import ConnectionPriority, ConnectionProxy, ConnectionPoolManager
+from server.database.connections import ConnectionPriority, ConnectionPoolManager
 from server.database.models import ActivityLog, LogAuthor, LogType, Severity
 from server.process.events import EventProxy, ExclusiveEventProxy
 
 from psycopg import sql
 from psycopg import errors as pg_errors
 
-__all__ = ('RECOVERABLE_ERRORS', 'Logger')
+__all__ = ('RECOVERABLE_ERRORS', 'LOG_INSERTION_SQL', 'LOG_COPY_SQL', 'Logger')
 
 RECOVERABLE_ERRORS: Final[tuple[type[pg_errors.Error], ...]] = (pg_errors.ConnectionTimeout,
                                                                 pg_errors.OperationalError,
@@ -23,9 +24,16 @@ LOG_INSERTION_SQL: Final[sql.Composed] = (sql.SQL('''INSERT INTO {tablename} ({c
                                                                                                for key in list(ActivityLog.model_fields.keys())]),
                                                           placeholder_template=sql.SQL(', ').join([sql.Placeholder()
                                                                                                    for _ in range(len(ActivityLog.model_fields))])))
+
+# Batched flushes stream rows through a single COPY
+LOG_COPY_SQL: Final[sql.Composed] = (sql.SQL('''COPY {tablename} ({columns_template}) FROM STDIN''')
+                                     .format(tablename=sql.Identifier('activity_logs'),
+                                             columns_template=sql.SQL(', ').join([sql.Identifier(key)
+                                                                                  for key in ActivityLog.model_fields.keys()])))
+
 class Logger:
     __slots__ = ('__weakref__',
-                 '_log_queue', 'connection_master',
+                 '_log_queue', '_spillover', '_flush_event', '_dropped_logs', 'connection_master',
                  '_batch_size', '_flush_interval', '_max_retries', '_waiting_period',
                  '_shutdown_event', '_cleanup_event', '_shutdown_polling_interval')
     
@@ -37,6 +45,8 @@ class Logger:
                  shutdown_polling_interval: float,
                  shutdown_event: EventProxy,
                  cleanup_event: asyncio.Event,
+                 queue_size: int = 0,
+                 spillover_size: int = 10_000,
                  max_retries: int = 3):
         # System coordination
         self._shutdown_event: Final[EventProxy] = shutdown_event
@@ -51,7 +61,11 @@ class Logger:
 
         # Database interactions
         self.connection_master: Final[ConnectionPoolManager] = connection_master
-        self._log_queue: Final[asyncio.Queue[ActivityLog]] = asyncio.Queue()
+        self._log_queue: Final[asyncio.Queue[ActivityLog]] = asyncio.Queue(maxsize=queue_size)    # 0 leaves the queue unbounded
+        # Overflow of a full queue
+        self._spillover: Final[deque[ActivityLog]] = deque(maxlen=spillover_size)
+        self._dropped_logs: int = 0
+        self._flush_event: Final[asyncio.Event] = asyncio.Event()   # Wakes the flusher early
 
         # Background tasks
         log_flush_task: Final[asyncio.Task[None]] = asyncio.create_task(self.flush_logs())
@@ -66,6 +80,10 @@ class Logger:
             raise ValueError("Batch size must be a positive integer")
         self._batch_size = value
     
+    @property
+    def dropped_logs(self) -> int:
+        return self._dropped_logs
+
     @property
     def max_retries(self) -> int:
         return self._max_retries
@@ -97,16 +115,41 @@ class Logger:
         try:
             await asyncio.wait_for(self._log_queue.put(log), timeout=self.waiting_period)
         except asyncio.TimeoutError:
+            self._dropped_logs += 1
             return
+        if self._log_queue.qsize() >= self.batch_size:
+            self._flush_event.set()
+
+    def enqueue_log_nowait(self, log: ActivityLog) -> None:
+        '''Enqueue a log entry without suspending the caller, spilling it over if the queue is full'''
+        # Keep order once spilling
+        if not self._spillover:
+            try:
+                self._log_queue.put_nowait(log)
+                if self._log_queue.qsize() >= self.batch_size:
+                    self._flush_event.set()
+                return
+            except asyncio.QueueFull:
+                pass
+
+        if len(self._spillover) == self._spillover.maxlen:
+            self._dropped_logs += 1     # Oldest spilled entry is evicted by the append
+        self._spillover.append(log)
+        self._flush_event.set()
+
+    def _refill_from_spillover(self) -> None:
+        while self._spillover and not self._log_queue.full():
+            self._log_queue.put_nowait(self._spillover.popleft())
 
     async def _flush_batch(self,
                            batch: Sequence[ActivityLog],
                            priority: ConnectionPriority = ConnectionPriority.LOW) -> None:
-        proxy: ConnectionProxy = await self.connection_master.request_connection(level=priority)
-        async with proxy.cursor() as cursor:
-            await cursor.executemany(LOG_INSERTION_SQL,
-                                    tuple(list(log_entry.model_dump().values()) for log_entry in batch))
-        await proxy.commit()
+        async with await self.connection_master.request_connection(level=priority) as proxy:
+            async with proxy.cursor() as cursor:
+                async with cursor.copy(LOG_COPY_SQL) as copy:
+                    for log_entry in batch:
+                        await copy.write_row(tuple(log_entry.model_dump().values()))
+            await proxy.commit()
 
     async def _emit_meta_log(self, pg_error: pg_errors.Error) -> None:
         try:
@@ -122,13 +165,16 @@ class Logger:
                         LOG_INSERTION_SQL,
                         tuple(meta_log.model_dump().values()),
                     )
-            await proxy.commit()
+                await proxy.commit()
         except Exception:
             pass
 
     async def _flush_with_retries(self,
                                   batch: list[ActivityLog],
                                   priority: ConnectionPriority) -> None:
+        if not batch:   # Nothing pending, skip leasing a connection entirely
+            return
+
         for retry in range(self.max_retries):
             try:
                 await self._flush_batch(batch, priority)
@@ -153,6 +199,8 @@ class Logger:
         log_entries: list[ActivityLog] = []
         while not self._log_queue.empty():
             log_entries.append(self._log_queue.get_nowait())
+        log_entries.extend(self._spillover)
+        self._spillover.clear()
         
         await self._flush_with_retries(log_entries, ConnectionPriority.HIGH)
         self._cleanup_event.set(self)
@@ -161,12 +209,17 @@ class Logger:
         log_entries: list[ActivityLog] = []
         while True:
             try:
-                for _ in range(self.batch_size):
-                    log_entries.append((await asyncio.wait_for(self._log_queue.get(), timeout=self.waiting_period)))  # Fetch only ActivityLog object in tuple at 0 index
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
             except asyncio.TimeoutError:
-                if not log_entries:
-                    continue
+                pass
+            self._flush_event.clear()
+
+            while not self._log_queue.empty() and len(log_entries) < self.batch_size:
+                log_entries.append(self._log_queue.get_nowait())
+            self._refill_from_spillover()
             
             await self._flush_with_retries(log_entries, ConnectionPriority.LOW)
-            
-            await asyncio.sleep(self.flush_interval)
+
+            # Flush leftovers right away
+            if self._log_queue.qsize() >= self.batch_size or self._spillover:
+                self._flush_event.set()